@@ -1,13 +1,23 @@
 import streamlit as st
-from datetime import datetime
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
 import os
-from PIL import Image
-import matplotlib.pyplot as plt
-from openai import OpenAI
+import io
+import math
+import uuid
+import time
+import threading
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-# ✅ Initialize OpenAI with env variable
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# ✅ Initialize OpenAI with env variable, imported only when AI analysis runs
+@st.cache_resource
+def get_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
 st.set_page_config(page_title="Report a Water Source", layout="wide")
 
@@ -34,25 +44,268 @@ This tool is for awareness only — we do not verify the safety of any water.
 """)
 
 IMAGE_DIR = "uploaded_images"
+GALLERY_PAGE_SIZE = 30
 os.makedirs(IMAGE_DIR, exist_ok=True)
 
-if "reports" not in st.session_state:
-    st.session_state.reports = []
+# 🧵 Photo writes run in the background so the form returns right away
+@st.cache_resource
+def image_executor():
+    return ThreadPoolExecutor(max_workers=4)
+
+# 📇 Names of the files in IMAGE_DIR, listed once; save_webp adds new files and
+# show_image drops ones that turn out to be missing
+@st.cache_resource
+def image_index():
+    return set(os.listdir(IMAGE_DIR))
+
+# 📥 Names queued for writing, so a repeat upload is not written twice
+@st.cache_resource
+def pending_images():
+    return set()
+
+def thumb_path(photo_path):
+    return os.path.splitext(photo_path)[0] + "_thumb.webp"
+
+def photo_error(data):
+    # Checked in the script thread, since background failures never reach the user
+    from PIL import Image
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.verify()
+    except Exception as e:
+        return e
+    return None
+
+def save_webp(img, path, index):
+    # Write to a unique temp name first so the gallery never reads a half-written file
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    img.save(tmp_path, "WEBP", quality=80, method=4)
+    os.replace(tmp_path, path)
+    index.add(os.path.basename(path))
+
+# Runs on a worker thread, so the shared sets are passed in rather than looked up
+def save_photo(path, data, index, pending):
+    from PIL import Image, ImageOps
+    try:
+        img = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        img.thumbnail((1280, 1280))
+        save_webp(img, path, index)
+        img.thumbnail((256, 256))
+        save_webp(img, thumb_path(path), index)
+    finally:
+        pending.discard(os.path.basename(path))
+
+def show_image(path, **kwargs):
+    try:
+        st.image(path, **kwargs)
+    except Exception:
+        # Removed outside the app; forget it so the next upload writes it again
+        image_index().discard(os.path.basename(path))
+        st.caption("📷 Photo unavailable")
+
+def log_photo_failure(future):
+    if future.exception() is not None:
+        logging.error("Saving uploaded photo failed", exc_info=future.exception())
+
+# 💾 Reports are stored as Parquet files, one per batch of new rows, merged into
+# a single file whenever a new session loads them
+REPORTS_DIR = "reports_data"
+os.makedirs(REPORTS_DIR, exist_ok=True)
+
+# 🗂️ Column types for the reports table
+SOURCE_TYPES = ["Faucet", "River/Stream", "Pipe Leak", "Fountain", "Rainwater Pool", "Other"]
+USED_OPTIONS = ["Yes", "No"]
+SCHEMA = {
+    "timestamp": "datetime64[ns]",
+    "address": "string[pyarrow]",
+    "zipcode": pd.CategoricalDtype(),
+    "description": "string[pyarrow]",
+    "concerns": "string[pyarrow]",
+    "type": pd.CategoricalDtype(SOURCE_TYPES),
+    "used": pd.CategoricalDtype(USED_OPTIONS),
+    "symptoms": "string[pyarrow]",
+    "alert": "bool",
+    "photo_path": "string[pyarrow]",
+}
+# Accepted spellings of the CSV alert column; blank means no alert
+ALERT_VALUES = {"true": True, "false": False, "yes": True, "no": False, "1": True, "0": False, "": False}
+TEXT_COLUMNS = [col for col, dt in SCHEMA.items() if dt == "string[pyarrow]"]
+CATEGORY_COLUMNS = [col for col, dt in SCHEMA.items() if isinstance(dt, pd.CategoricalDtype)]
+
+def empty_reports():
+    return pd.DataFrame({col: pd.Series(dtype=dt) for col, dt in SCHEMA.items()})
+
+# 🔒 Loading and compacting must not overlap, or two sessions could merge the same files
+@st.cache_resource
+def reports_lock():
+    return threading.Lock()
+
+def write_reports_file(rows, name):
+    # Categories are written as plain strings so every file shares one schema
+    # Readers skip "."-prefixed files, so a half-written file is never loaded
+    tmp_path = os.path.join(REPORTS_DIR, f".{name}.tmp")
+    rows.astype({col: "string[pyarrow]" for col in CATEGORY_COLUMNS}).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, os.path.join(REPORTS_DIR, name))
+
+def compact_reports(reports_df, names):
+    # Reuse the newest name so the merged rows keep their place in file order
+    write_reports_file(reports_df, names[-1])
+    for name in names[:-1]:
+        os.remove(os.path.join(REPORTS_DIR, name))
+
+def load_reports():
+    with reports_lock():
+        # File names start with the write time, so sorting restores submission order
+        names = sorted(name for name in os.listdir(REPORTS_DIR) if name.endswith(".parquet"))
+        frames, read_names = [], []
+        for name in names:
+            try:
+                frames.append(pd.read_parquet(os.path.join(REPORTS_DIR, name), columns=list(SCHEMA)))
+                read_names.append(name)
+            except Exception as e:
+                st.warning(f"⚠️ Skipped unreadable report file {name}: {e}")
+        if not frames:
+            return empty_reports()
+        reports_df = pd.concat(frames, ignore_index=True).astype(SCHEMA)
+        if len(read_names) > 1:
+            try:
+                compact_reports(reports_df, read_names)
+            except Exception:
+                logging.exception("Compacting report files failed")
+        return reports_df
+
+def save_reports(new_rows):
+    write_reports_file(new_rows, f"{time.time_ns():020d}_{uuid.uuid4().hex}.parquet")
+
+# 🔢 Bumped on every change so derived views know when to rebuild
+def bump_version():
+    st.session_state.reports_version = st.session_state.get("reports_version", 0) + 1
+
+if "reports_df" not in st.session_state:
+    st.session_state.reports_df = load_reports()
+    bump_version()
+if "derived_views" not in st.session_state:
+    st.session_state.derived_views = {}
 if "uploader_key" not in st.session_state:
     st.session_state.uploader_key = 0
 
 def update_key():
     st.session_state.uploader_key += 1
 
-def load_data():
-    return pd.DataFrame(st.session_state.reports)
+def add_reports(new_rows):
+    # new_rows must already match SCHEMA; blank text cells become "" so the
+    # gallery can test them for truthiness
+    new_rows = new_rows.fillna({col: "" for col in TEXT_COLUMNS})
+    save_reports(new_rows)
+    reports_df = st.session_state.reports_df
+    if reports_df.empty:
+        st.session_state.reports_df = new_rows.reset_index(drop=True)
+    else:
+        # Concat only keeps a categorical column when both sides share categories
+        shared = {
+            col: pd.CategoricalDtype(reports_df[col].cat.categories.union(new_rows[col].cat.categories))
+            for col in CATEGORY_COLUMNS
+        }
+        st.session_state.reports_df = pd.concat(
+            [reports_df.astype(shared), new_rows.astype(shared)], ignore_index=True
+        )
+    bump_version()
+
+# ♻️ Derived views are memoized per session and dropped whenever reports_version
+# changes, so each session only holds views of its current reports
+def derived_view(key, build, *args):
+    views = st.session_state.derived_views
+    if views.get("version") != st.session_state.reports_version:
+        views.clear()
+        views["version"] = st.session_state.reports_version
+    if key not in views:
+        views[key] = build(st.session_state.reports_df, *args)
+    return views[key]
+
+def compute_trends(df):
+    weeks = df["timestamp"].dt.to_period("W").astype(str).rename("week")
+    return df.groupby([df["zipcode"], weeks], observed=True).size().reset_index(name="report_count")
+
+def get_table_view(df):
+    return df.drop(columns=["photo_path"], errors="ignore")
+
+def get_csv_bytes(df):
+    return derived_view("table", get_table_view).to_csv(index=False).encode("utf-8")
+
+def get_parquet_bytes(df):
+    return derived_view("table", get_table_view).to_parquet(index=False)
+
+def top_concerns(concerns):
+    names = concerns.str.split(", ").explode()
+    return ", ".join(names[names != ""].value_counts().head(3).index)
+
+# 🧾 Weekly counts and top concerns for one ZIP, serialized for the AI prompt
+def get_weekly_summary(df, zip_code):
+    rows = df[df["zipcode"] == zip_code]
+    weeks = rows["timestamp"].dt.to_period("W").astype(str).rename("week")
+    summary = rows.groupby(weeks).agg(
+        reports=("concerns", "size"),
+        top_concerns=("concerns", top_concerns),
+    )
+    return summary.tail(12).reset_index().to_json(orient="records")
+
+# 🗃️ Finished analyses shared by all sessions, kept for an hour, newest 256 only
+ANALYSIS_TTL = 3600
+ANALYSIS_MAX_ENTRIES = 256
 
-# Tabs
-report_tab, gallery_tab, table_tab, trends_tab, ai_analysis_tab = st.tabs([
+@st.cache_resource
+def analysis_cache():
+    return {"lock": threading.Lock(), "entries": OrderedDict()}
+
+def get_cached_analysis(key):
+    cache = analysis_cache()
+    with cache["lock"]:
+        entry = cache["entries"].get(key)
+        if entry is None:
+            return None
+        stored_at, text = entry
+        if time.time() - stored_at > ANALYSIS_TTL:
+            del cache["entries"][key]
+            return None
+        return text
+
+def store_analysis(key, text):
+    cache = analysis_cache()
+    with cache["lock"]:
+        entries = cache["entries"]
+        entries[key] = (time.time(), text)
+        entries.move_to_end(key)
+        while len(entries) > ANALYSIS_MAX_ENTRIES:
+            entries.popitem(last=False)
+
+# 🤖 Streams the analysis text as it arrives from the API
+def stream_analysis(zip_code, payload):
+    system_prompt = f"""
+    You are analyzing water quality reports for ZIP code {zip_code}.
+    Summarize the major issues, repeated trends, and any areas of concern.
+    """
+    response = get_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Report data: {payload}"}
+        ],
+        max_tokens=300,
+        temperature=0.5,
+        stream=True
+    )
+    for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+# Sections: only the selected one runs, unlike st.tabs which executes every tab
+section = st.radio("Section", [
     "📋 Report", "🖼️ Gallery", "📊 Tabular View", "📈 Community Trends", "🤖AI Analysis"
-])
+], horizontal=True, key="section", label_visibility="collapsed")
 
-with report_tab:
+if section == "📋 Report":
     st.header("Submit a Water Report or Upload a CSV")
 
     uploaded_file = st.file_uploader(
@@ -63,16 +316,33 @@ with report_tab:
 
     if uploaded_file:
         try:
-            uploaded_df = pd.read_csv(uploaded_file)
-            required_columns = ["timestamp", "address", "zipcode", "description", "concerns", "type", "used", "symptoms", "alert", "photo_path"]
-            missing_columns = [col for col in required_columns if col not in uploaded_df.columns]
+            # Types go to the parser itself: pandas' dtype= is applied only after pyarrow
+            # has inferred ZIP codes as integers and dropped their leading zeros
+            column_types = {col: pa.string() for col in TEXT_COLUMNS + CATEGORY_COLUMNS + ["alert"]}
+            table = pa_csv.read_csv(uploaded_file, convert_options=pa_csv.ConvertOptions(column_types=column_types))
+            uploaded_df = table.to_pandas(types_mapper=pd.ArrowDtype)
+            missing_columns = set(SCHEMA).difference(uploaded_df.columns)
             if missing_columns:
-                st.error(f"Missing columns: {', '.join(missing_columns)}")
+                st.error(f"Missing columns: {', '.join(sorted(missing_columns))}")
             else:
-                uploaded_df["timestamp"] = pd.to_datetime(uploaded_df["timestamp"], errors="coerce")
-                st.session_state.reports.extend(uploaded_df.to_dict(orient="records"))
-                st.success("✅ CSV uploaded and merged successfully!")
-                update_key()
+                # Values outside the fixed categories would silently become NaN
+                invalid_values = {
+                    col: sorted(set(uploaded_df[col].dropna()) - set(SCHEMA[col].categories))
+                    for col in ["type", "used"]
+                }
+                alert_text = uploaded_df["alert"].fillna("").str.strip().str.lower()
+                invalid_values["alert"] = sorted(set(alert_text) - set(ALERT_VALUES))
+                invalid_values = {col: values for col, values in invalid_values.items() if values}
+                if invalid_values:
+                    st.error("Invalid values: " + "; ".join(
+                        f"{col}: {', '.join(values)}" for col, values in invalid_values.items()
+                    ))
+                else:
+                    uploaded_df["timestamp"] = pd.to_datetime(uploaded_df["timestamp"], errors="coerce")
+                    uploaded_df["alert"] = alert_text.map(ALERT_VALUES).astype(bool)
+                    add_reports(uploaded_df[list(SCHEMA)].astype(SCHEMA))
+                    st.success("✅ CSV uploaded and merged successfully!")
+                    update_key()
         except Exception as e:
             st.error(f"Error processing uploaded CSV: {e}")
 
@@ -83,22 +353,31 @@ with report_tab:
         photo = st.file_uploader("📷 Upload a photo (optional)", type=["jpg", "jpeg", "png"])
         description = st.text_area("📝 Description", max_chars=300)
         concerns = st.multiselect("🚩 Observed issues:", ["Discoloration", "Foul smell", "Foam", "Bugs", "Industrial area", "Trash nearby"])
-        source_type = st.selectbox("🧭 Source Type", ["Faucet", "River/Stream", "Pipe Leak", "Fountain", "Rainwater Pool", "Other"])
-        used = st.radio("Did you use this water?", ["Yes", "No"])
+        source_type = st.selectbox("🧭 Source Type", SOURCE_TYPES)
+        used = st.radio("Did you use this water?", USED_OPTIONS)
         symptoms = st.text_input("Any symptoms after use? (optional)")
         alert_others = st.checkbox("Send community alert")
         submitted = st.form_submit_button("Submit Report")
 
-        if submitted:
+        photo_problem = photo_error(photo.getvalue()) if submitted and photo else None
+        if photo_problem:
+            st.error(f"Could not read the uploaded photo: {photo_problem}")
+        elif submitted:
             photo_path = None
             if photo:
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{photo.name}"
-                photo_path = os.path.join(IMAGE_DIR, filename)
-                with open(photo_path, "wb") as f:
-                    f.write(photo.getbuffer())
+                # Name files by content so repeat uploads share one copy
+                digest = hashlib.blake2b(photo.getbuffer(), digest_size=16).hexdigest()
+                photo_path = os.path.join(IMAGE_DIR, f"{digest}.webp")
+                index, pending = image_index(), pending_images()
+                name = os.path.basename(photo_path)
+                if name not in pending and not os.path.exists(photo_path):
+                    pending.add(name)
+                    # The gallery skips photos that are not on disk yet
+                    future = image_executor().submit(save_photo, photo_path, photo.getvalue(), index, pending)
+                    future.add_done_callback(log_photo_failure)
 
             report = {
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                "timestamp": pd.Timestamp.now().floor("min"),
                 "address": address,
                 "zipcode": zipcode,
                 "description": description,
@@ -109,17 +388,18 @@ with report_tab:
                 "alert": alert_others,
                 "photo_path": photo_path,
             }
-            st.session_state.reports.append(report)
-            st.success("✅ Your report has been submitted. Thank you!")
+            new_row = pd.DataFrame({col: pd.Series([value], dtype=SCHEMA[col]) for col, value in report.items()})
+            try:
+                add_reports(new_row)
+                st.success("✅ Your report has been submitted. Thank you!")
+            except Exception as e:
+                st.error(f"Could not save your report: {e}")
 
-with gallery_tab:
+elif section == "🖼️ Gallery":
     st.header("🖼️ Community Gallery of Reports")
-    df = pd.DataFrame(st.session_state.reports)
+    df = st.session_state.reports_df
     if not df.empty:
-        df['zipcode'] = df['zipcode'].astype(str)
-        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-
-        selected_zip = st.selectbox("Filter by ZIP Code (optional):", ["All"] + sorted(df['zipcode'].dropna().unique()))
+        selected_zip = st.selectbox("Filter by ZIP Code (optional):", ["All"] + df['zipcode'].cat.categories.tolist())
         if selected_zip != "All":
             df = df[df['zipcode'] == selected_zip]
 
@@ -127,93 +407,95 @@ with gallery_tab:
         df = df.sort_values(by='timestamp', ascending=(sort_option == "Oldest First"))
 
         view_option = st.radio("Choose view:", ["Grid View", "Detailed View"], horizontal=True)
-        reports = df.to_dict(orient='records')
+
+        # Show one page of cards at a time so large galleries stay light
+        page_count = max(1, math.ceil(len(df) / GALLERY_PAGE_SIZE))
+        if st.session_state.get("gallery_page", 1) > page_count:
+            st.session_state.gallery_page = 1
+        page = 1
+        if page_count > 1:
+            page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key="gallery_page")
+        df = df.iloc[(page - 1) * GALLERY_PAGE_SIZE:page * GALLERY_PAGE_SIZE]
+
+        # Copy so background writers can keep adding names while we read
+        stored_paths = {os.path.join(IMAGE_DIR, name) for name in image_index().copy()}
+        paths = df['photo_path']
+        photo_exists = paths.isin(stored_paths)
+        # Paths outside IMAGE_DIR (e.g. from an uploaded CSV) are not indexed, so stat those
+        outside = (paths != "") & (paths.map(os.path.dirname) != IMAGE_DIR)
+        photo_exists[outside] = paths[outside].map(os.path.exists).astype(bool)
+        df = df.assign(
+            photo_exists=photo_exists,
+            thumb_exists=(paths.str.replace(r"\.[^./\\]*$", "", regex=True) + "_thumb.webp").isin(stored_paths),
+            time_text=df['timestamp'].dt.strftime("%Y-%m-%d %H:%M").fillna(""),
+        )
 
         if view_option == "Grid View":
-            rows = [reports[i:i + 3] for i in range(0, len(reports), 3)]
-            for row in rows:
-                cols = st.columns(len(row))
-                for col, report in zip(cols, row):
-                    with col:
-                        st.markdown(f"**📍 {report['address']}**")
-                        st.markdown(f"🕒 {report['timestamp']}")
-                        if report.get("photo_path") and os.path.exists(report["photo_path"]):
-                            st.image(report["photo_path"], use_container_width=True)
-                        st.markdown(f"**Type:** {report['type']} | **Used:** {report['used']}")
-                        if report['symptoms']:
-                            st.markdown(f"*Symptoms:* {report['symptoms']}")
+            # Build each card's text column-wise so a card needs two markdown calls, not four
+            header = "**📍 " + df['address'].astype(str) + "**\n\n🕒 " + df['time_text']
+            footer = "**Type:** " + df['type'].astype(str) + " | **Used:** " + df['used'].astype(str)
+            footer = footer.where(df['symptoms'] == "", footer + "\n\n*Symptoms:* " + df['symptoms'].astype(str))
+            cols = st.columns(3)
+            for i, report in enumerate(df.assign(card_header=header, card_footer=footer).itertuples()):
+                with cols[i % 3]:
+                    st.markdown(report.card_header)
+                    if report.thumb_exists:
+                        show_image(thumb_path(report.photo_path), use_container_width=True)
+                    elif report.photo_exists:
+                        show_image(report.photo_path, use_container_width=True)
+                    st.markdown(report.card_footer)
         else:
-            for report in reports:
-                with st.expander(f"📍 {report['address']} ({report['timestamp']})"):
-                    st.write(f"**Source Type:** {report['type']} | **Used:** {report['used']}")
-                    if report['concerns']:
-                        st.write(f"**Concerns:** {report['concerns']}")
-                    if report['symptoms']:
-                        st.write(f"**Symptoms after use:** {report['symptoms']}")
-                    st.write(f"**Description:** {report['description']}")
-                    if report.get("photo_path") and os.path.exists(report["photo_path"]):
-                        st.image(report["photo_path"], caption="Reported Photo", use_container_width=True)
+            for report in df.itertuples():
+                with st.expander(f"📍 {report.address} ({report.time_text})"):
+                    st.write(f"**Source Type:** {report.type} | **Used:** {report.used}")
+                    if report.concerns:
+                        st.write(f"**Concerns:** {report.concerns}")
+                    if report.symptoms:
+                        st.write(f"**Symptoms after use:** {report.symptoms}")
+                    st.write(f"**Description:** {report.description}")
+                    # Only send the full image once the reader asks for it
+                    if report.photo_exists and st.toggle("📷 Show photo", key=f"photo_{report.Index}"):
+                        show_image(report.photo_path, caption="Reported Photo", use_container_width=True)
     else:
         st.info("No reports to display yet.")
 
-with table_tab:
-    df = pd.DataFrame(st.session_state.reports).drop(columns=["photo_path"], errors="ignore")
+elif section == "📊 Tabular View":
     st.subheader("📊 Tabular View of Reports")
-    st.dataframe(df, use_container_width=True)
-    st.download_button("📥 Download Reports CSV", df.to_csv(index=False).encode("utf-8"), "water_reports.csv")
+    st.dataframe(derived_view("table", get_table_view), use_container_width=True)
+    st.download_button("📥 Download Reports CSV", derived_view("csv", get_csv_bytes), "water_reports.csv")
+    st.download_button("📥 Download Reports Parquet", derived_view("parquet", get_parquet_bytes), "water_reports.parquet")
 
-with trends_tab:
+elif section == "📈 Community Trends":
     st.header("📈 Community Trends by Zip Code")
-    data = load_data()
-    if not data.empty:
-        data['timestamp'] = pd.to_datetime(data['timestamp'])
-        data['week'] = data['timestamp'].dt.to_period("W").astype(str)
-        trend_data = data.groupby(['zipcode', 'week']).size().reset_index(name='report_count')
-        selected_zip = st.selectbox("Select a Zip Code to View Trends", trend_data['zipcode'].unique())
+    if not st.session_state.reports_df.empty:
+        trend_data = derived_view("trends", compute_trends)
+        selected_zip = st.selectbox("Select a Zip Code to View Trends", trend_data['zipcode'].cat.categories.tolist())
         selected_data = trend_data[trend_data['zipcode'] == selected_zip]
 
         st.subheader(f"📍 Reports Over Time for Zip Code: {selected_zip}")
-        fig, ax = plt.subplots(figsize=(12, 6))
-        ax.plot(selected_data['week'], selected_data['report_count'], marker='o')
-        ax.set_xticks(selected_data['week'][::4])
-        ax.set_xticklabels(selected_data['week'][::4], rotation=45)
-        ax.set_title(f"Water Source Reports - {selected_zip}")
-        ax.set_xlabel("Week")
-        ax.set_ylabel("Reports")
-        st.pyplot(fig)
+        st.line_chart(selected_data.set_index('week')['report_count'], x_label="Week", y_label="Reports")
 
         st.subheader("Top Zip Codes by Total Reports")
-        top_zips = trend_data.groupby('zipcode')['report_count'].sum().sort_values(ascending=False).head(5)
+        top_zips = trend_data.groupby('zipcode', observed=True)['report_count'].sum().sort_values(ascending=False).head(5)
         st.bar_chart(top_zips)
     else:
         st.info("Submit some reports to see trends.")
 
-with ai_analysis_tab:
+elif section == "🤖AI Analysis":
     st.header("🤖 AI Analysis of Reports")
-    data = load_data()
-    if not data.empty:
-        data['timestamp'] = pd.to_datetime(data['timestamp'])
-        data['week'] = data['timestamp'].dt.to_period("W").astype(str)
-        trend_data = data.groupby(['zipcode', 'week']).size().reset_index(name='report_count')
-        selected_zip = st.selectbox("Select a Zip Code to Analyze", trend_data['zipcode'].unique())
+    if not st.session_state.reports_df.empty:
+        selected_zip = st.selectbox("Select a Zip Code to Analyze", st.session_state.reports_df['zipcode'].cat.categories.tolist())
         if st.button("🔍 Analyze"):
-            weekly_summary = trend_data[trend_data['zipcode'] == selected_zip].tail(12).to_dict(orient='records')
-            system_prompt = f"""
-            You are analyzing water quality reports for ZIP code {selected_zip}.
-            Summarize the major issues, repeated trends, and any areas of concern.
-            """
-            user_prompt = f"Report data: {weekly_summary}"
+            payload = derived_view(("summary", selected_zip), get_weekly_summary, selected_zip)
+            payload_hash = hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+            # Identical ZIP + payload pairs reuse the earlier answer instead of calling the API again
+            cache_key = (selected_zip, payload_hash)
             try:
-                response = client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    max_tokens=300,
-                    temperature=0.5
-                )
-                st.markdown(response.choices[0].message.content)
+                cached = get_cached_analysis(cache_key)
+                if cached is not None:
+                    st.markdown(cached)
+                else:
+                    store_analysis(cache_key, st.write_stream(stream_analysis(selected_zip, payload)))
             except Exception as e:
                 st.error(f"AI analysis failed: {e}")
     else: